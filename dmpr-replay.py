@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import argparse
+import subprocess
+import multiprocessing
+import math
+import glob
+import cairo
+
+import simtrace
+
+
+def draw_frame_range(ctx, frame):
+    color = ((1.0, 1.0, 0.5, 0.05), (1.0, 0.0, 1.0, 0.05),
+             (0.5, 1.0, 0.0, 0.05), (1.0, 0.5, 1.0, 0.05))
+    color_interface_links = ((1.0, 0.15, 0.15, 1.0), (0.15, 1.0, 0.15, 1.0),
+                             (0.45, 0.2, 0.15, 1.0), (0.85, 0.5, 0.45, 1.0))
+    ctx.rectangle(0, 0, frame.area_x, frame.area_y)
+    ctx.set_source_rgba(0.15, 0.15, 0.15, 1.0)
+    ctx.fill()
+
+    for idx, (id_, ranges) in frame.nodes.items():
+        x, y = frame.positions[idx]
+        for if_idx, range_ in ranges.items():
+            ctx.set_source_rgba(*color[if_idx % len(color)])
+            ctx.move_to(x, y)
+            ctx.arc(x, y, range_, 0, 2 * math.pi)
+            ctx.fill()
+
+    path_thinkness = 5.0
+    for if_idx in sorted(frame.links):
+        ctx.set_line_width(path_thinkness)
+        ctx.set_source_rgba(*color_interface_links[if_idx % len(color_interface_links)])
+        for a, b in frame.links[if_idx]:
+            ctx.move_to(*frame.positions[a])
+            ctx.line_to(*frame.positions[b])
+            ctx.stroke()
+        path_thinkness -= 1.0
+
+    for idx, (id_, ranges) in frame.nodes.items():
+        x, y = frame.positions[idx]
+
+        # node middle point
+        ctx.set_source_rgb(0.5, 1, 0.5)
+        ctx.move_to(x, y)
+        ctx.arc(x, y, 5, 0, 2 * math.pi)
+        ctx.fill()
+
+        # router id
+        ctx.set_font_size(10)
+        ctx.set_source_rgb(0.5, 1, 0.7)
+        ctx.move_to(x + 10, y + 10)
+        ctx.show_text(id_)
+
+
+def draw_frame_transmission(ctx, frame):
+    ctx.rectangle(0, 0, frame.area_x, frame.area_y)
+    ctx.set_source_rgba(0.15, 0.15, 0.15, 1.0)
+    ctx.fill()
+
+    # transmitting circles
+    for if_idx, idx, size in frame.tx:
+        x, y = frame.positions[idx]
+        ctx.set_source_rgba(.10, .10, .10, 1.0)
+        ctx.move_to(x, y)
+        ctx.arc(x, y, 50, 0, 2 * math.pi)
+        ctx.fill()
+
+    path_thinkness = 6.0
+    for if_idx in sorted(frame.links):
+        ctx.set_line_width(path_thinkness)
+        ctx.set_source_rgba(.0, .0, .0, .4)
+        for a, b in frame.links[if_idx]:
+            ctx.move_to(*frame.positions[a])
+            ctx.line_to(*frame.positions[b])
+            ctx.stroke()
+        path_thinkness = max(path_thinkness - 4.0, 2.0)
+
+    # draw dots over all
+    for idx in frame.nodes:
+        x, y = frame.positions[idx]
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.move_to(x, y)
+        ctx.arc(x, y, 5, 0, 2 * math.pi)
+        ctx.fill()
+
+
+def draw_frame(out_dir, frame, height, img_idx):
+    """ range and transmission view side by side, scaled so
+    that the simulation area fits into the requested height """
+    scale = height / frame.area_y
+    width = int(frame.area_x * scale)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 2 * width, height)
+    ctx = cairo.Context(surface)
+    ctx.scale(scale, scale)
+    draw_frame_range(ctx, frame)
+    ctx.identity_matrix()
+    ctx.translate(width, 0)
+    ctx.scale(scale, scale)
+    draw_frame_transmission(ctx, frame)
+
+    full_path = os.path.join(out_dir, "{0:05}.png".format(img_idx))
+    surface.write_to_png(full_path)
+
+
+def render_window(args, start, end):
+    """ renders all frames in [start, end), decoding starts at the
+    trace segment containing start. Images are numbered from 0 for
+    the first rendered second of the whole replay """
+    first = args.start + (-args.start % args.every)
+    reader = simtrace.TraceReader(args.trace)
+    for frame in reader.frames(start=start):
+        if frame.time >= end:
+            break
+        if frame.time < start or frame.time % args.every != 0:
+            continue
+        draw_frame(args.output, frame, args.height, (frame.time - first) // args.every)
+
+
+def setup_output_folder(out_dir):
+    """ remove images of a previous replay, they would end up in the video """
+    os.makedirs(out_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(out_dir, "[0-9][0-9][0-9][0-9][0-9].png")):
+        os.remove(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="render a DMPR simulator trace")
+    parser.add_argument("trace", help="trace file, e.g. run-data/<scenario>/trace.bin.xz")
+    parser.add_argument("--output", default="images-replay",
+                        help="output directory for the rendered frames")
+    parser.add_argument("--height", type=int, default=1080,
+                        help="image height in pixel, width follows the simulation area")
+    parser.add_argument("--start", type=int, default=0,
+                        help="first simulation second to render")
+    parser.add_argument("--end", type=int, default=None,
+                        help="last simulation second (exclusive), default: end of trace")
+    parser.add_argument("--every", type=int, default=1,
+                        help="render only every n-th simulation second")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="number of parallel render processes")
+    parser.add_argument("--video", default=None,
+                        help="encode the rendered frames into this video file (ffmpeg)")
+    parser.add_argument("--framerate", type=int, default=10,
+                        help="video frame rate")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.end is None:
+        args.end = simtrace.TraceReader(args.trace).end()
+    if args.end <= args.start:
+        print("empty time window [{}, {})".format(args.start, args.end))
+        sys.exit(1)
+    setup_output_folder(args.output)
+
+    jobs = max(1, min(args.jobs, args.end - args.start))
+    chunk = int(math.ceil((args.end - args.start) / jobs))
+    windows = [(args, s, min(s + chunk, args.end)) for s in range(args.start, args.end, chunk)]
+    with multiprocessing.Pool(jobs) as pool:
+        pool.starmap(render_window, windows)
+
+    if args.video:
+        cmd = ["ffmpeg", "-y", "-framerate", str(args.framerate),
+               "-start_number", "0", "-i", os.path.join(args.output, "%05d.png"),
+               "-c:v", "libx264", "-pix_fmt", "yuv420p", args.video]
+        subprocess.check_call(cmd)
+
+
+if __name__ == '__main__':
+    main()
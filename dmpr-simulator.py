@@ -22,6 +22,9 @@ import lzma
 from PIL import Image
 
 import core.dmpr
+import simtrace
+import msgcodec
+import telemetry
 
 
 NO_ROUTER = 100
@@ -78,11 +81,14 @@ class LoggerClone:
 class Router:
 
 
-    def __init__(self, id_, interfaces=None, mm=None, log_directory=None, msg_compress=True):
+    def __init__(self, id_, interfaces=None, mm=None, log_directory=None,
+                 msg_compress=True, msg_format="json"):
         self.id = id_
         self.log = LoggerClone(os.path.join(log_directory, "logs"), id_)
         self._log_directory = log_directory
         self._do_msg_compress = msg_compress
+        assert(msg_format in ("json", "binary"))
+        self._msg_format = msg_format
         assert(mm)
         self.mm = mm
         assert(interfaces)
@@ -97,6 +103,9 @@ class Router:
             self.interface_addr[interface['name']]['v6'] = self._rand_ip_addr("v6")
 
         self.transmission_within_second = False
+        self.tx_msgs_tick = dict()
+        self.tx_bytes_tick = dict()
+        self._tracer = None
 
         self._setup_core()
 
@@ -259,30 +268,47 @@ class Router:
 
 
     def _msg_compress(self, msg):
-        msg_bin = msg.encode("ascii", "ignore")
-        msg_comp = lzma.compress(msg_bin)
+        msg_comp = lzma.compress(msg)
         return msg_comp
 
 
     def _msg_decompress(self, msg):
         msg_bin = lzma.decompress(msg)
-        msg_str = msg_bin.decode('ascii')
-        return msg_str
+        return msg_bin
+
+
+    def _msg_encode(self, msg):
+        if self._msg_format == "binary":
+            return msgcodec.encode(msg)
+        msg_json = json.dumps(msg)
+        return msg_json.encode("ascii", "ignore")
+
+
+    def _msg_decode(self, msg):
+        if self._msg_format == "binary":
+            return msgcodec.decode(msg)
+        msg_str = msg.decode('ascii')
+        return json.loads(msg_str)
 
 
     def msg_tx_cb(self, interface_name, proto, dst_mcast_addr, msg, priv_data=None):
         #print(pprint.pformat(msg))
-        msg_json = json.dumps(msg)
-        print("message size: {} bytes (uncompressed)".format(len(msg_json)))
+        msg = self._msg_encode(msg)
+        print("message size: {} bytes ({}, uncompressed)".format(len(msg), self._msg_format))
         if self._do_msg_compress:
-            msg = self._msg_compress(msg_json)
-            print("message size: {} bytes (compressed)".format(len(msg)))
+            msg = self._msg_compress(msg)
+            print("message size: {} bytes ({}, compressed)".format(len(msg), self._msg_format))
         """ this function is called when core stated
         that a routing message must be transmitted
         """
         emsg = "msg transmission [interface:{}, proto:{}, addr:{}]"
         self.log.info(emsg.format(interface_name, proto, dst_mcast_addr),
                       time=self.get_time())
+        self.transmission_within_second = True
+        self.tx_msgs_tick[interface_name] = self.tx_msgs_tick.get(interface_name, 0) + 1
+        self.tx_bytes_tick[interface_name] = self.tx_bytes_tick.get(interface_name, 0) + len(msg)
+        if self._tracer:
+            self._tracer.msg_tx(self, interface_name, len(msg))
         # send message to all connected routers
         for r_id, r_obj in self.connections[interface_name].items():
             r_obj.msg_rx(interface_name, msg)
@@ -291,7 +317,7 @@ class Router:
     def msg_rx(self, interface_name, msg):
         if self._do_msg_compress:
             msg = self._msg_decompress(msg)
-        msg_dict = json.loads(msg)
+        msg_dict = self._msg_decode(msg)
         self._core.msg_rx(interface_name, msg_dict)
 
 
@@ -299,12 +325,19 @@ class Router:
         self.r = r
 
 
+    def register_tracer(self, tracer):
+        self._tracer = tracer
+
+
     def get_time(self, priv_data=None):
         return self._time
 
 
     def step(self, time):
         self._time = time
+        self.transmission_within_second = False
+        self.tx_msgs_tick.clear()
+        self.tx_bytes_tick.clear()
         self.mm.step()
         self.connect()
         self._core.tick()
@@ -624,7 +657,168 @@ class MobilityModel(object):
 
 
 
-def two_router_static_in_range(scenario_name):
+SIMU_TIME = 1000
+
+
+class AirtimeAccounting(object):
+    """ Channel utilization of the routing traffic. Evaluated once per
+    tick on the bytes every router transmitted within the tick. The
+    interface bandwidth is interpreted as bit/s, the airtime of a
+    router is the time the channel is occupied by itself and all
+    neighbors in range - the share of the second it cannot send.
+
+    The channel is shared within the neighborhood, so this airtime
+    in percent is the routing overhead. Per tick and interface
+    airtime.csv contains its mean and max over all routers. Averages
+    are printed at the end, per tick only if verbose. """
+
+    HEADER = "time,interface,tx-msgs,tx-bytes,overhead-mean-percent,overhead-max-percent\n"
+
+    def __init__(self, ld, verbose=False):
+        self._verbose = verbose
+        self._fd = open(os.path.join(ld, "airtime.csv"), 'w')
+        self._fd.write(AirtimeAccounting.HEADER)
+        self.last = dict()
+        self._sum_overhead = dict()
+        self._max_overhead = dict()
+        self._ticks = 0
+
+
+    def _interface_airtime(self, r, name):
+        tx_msgs = tx_bytes = 0
+        overheads = list()
+        for router in r:
+            bandwidth = None
+            for interface in router.interfaces:
+                if interface['name'] == name:
+                    bandwidth = interface.get('bandwidth')
+            if not bandwidth:
+                continue
+            tx_msgs += router.tx_msgs_tick.get(name, 0)
+            tx_bytes += router.tx_bytes_tick.get(name, 0)
+            busy_bytes = router.tx_bytes_tick.get(name, 0)
+            for neighbor in router.connections[name].values():
+                busy_bytes += neighbor.tx_bytes_tick.get(name, 0)
+            overheads.append(100.0 * busy_bytes * 8 / bandwidth)
+        if not overheads:
+            return None
+        return dict(tx_msgs=tx_msgs, tx_bytes=tx_bytes,
+                    overhead_mean=sum(overheads) / len(overheads),
+                    overhead_max=max(overheads))
+
+
+    def tick(self, time, r):
+        names = list()
+        for router in r:
+            for interface in router.interfaces:
+                if interface['name'] not in names:
+                    names.append(interface['name'])
+
+        self.last = dict()
+        self._ticks += 1
+        for name in names:
+            a = self._interface_airtime(r, name)
+            if not a:
+                continue
+            self.last[name] = a
+            self._sum_overhead[name] = self._sum_overhead.get(name, 0.0) + a['overhead_mean']
+            self._max_overhead[name] = max(self._max_overhead.get(name, 0.0), a['overhead_max'])
+            self._fd.write("{},{},{},{},{:.4f},{:.4f}\n".format(
+                           time, name, a['tx_msgs'], a['tx_bytes'],
+                           a['overhead_mean'], a['overhead_max']))
+            if not self._verbose:
+                continue
+            print("airtime {:>8}: {:4} msgs {:7} bytes, overhead mean {:6.2f}% max {:6.2f}%".format(
+                  name, a['tx_msgs'], a['tx_bytes'], a['overhead_mean'], a['overhead_max']))
+
+
+    def close(self):
+        self._fd.close()
+        for name in self._sum_overhead:
+            print("airtime {:>8}: average overhead {:6.2f}%, max overhead {:6.2f}% of the neighborhood channel".format(
+                  name, self._sum_overhead[name] / self._ticks, self._max_overhead[name]))
+
+
+def telemetry_snapshot(sec, start_time, phases, counters, airtime, r):
+    elapsed = time.monotonic() - start_time
+    nodes = list()
+    for router in r:
+        x, y = router.coordinates()
+        neighbors = dict()
+        for name, connections in router.connections.items():
+            neighbors[name] = list(connections.keys())
+        nodes.append(dict(id=router.id, x=x, y=y, neighbors=neighbors))
+    return dict(time=sec, simu_time=SIMU_TIME, elapsed=elapsed,
+                speed=(sec + 1) / elapsed if elapsed > 0 else None,
+                phases=copy.deepcopy(phases), counters=copy.deepcopy(counters),
+                airtime=airtime.last if airtime else None, nodes=nodes)
+
+
+def simulate(ld, area, r, args):
+    tracer = None
+    if args.trace:
+        tracer = simtrace.TraceWriter(os.path.join(ld, "trace.bin.xz"), area)
+        for router in r:
+            router.register_tracer(tracer)
+    airtime = None
+    if not args.no_airtime:
+        airtime = AirtimeAccounting(ld, verbose=args.airtime_verbose)
+    telem = None
+    if args.telemetry_port or args.telemetry_socket:
+        telem = telemetry.Telemetry(port=args.telemetry_port,
+                                    unix_socket=args.telemetry_socket)
+
+    # per phase wall clock seconds, last tick and accumulated
+    phases = dict()
+    counters = dict(tx_msgs=0, tx_bytes=0, interfaces=dict())
+    start_time = time.monotonic()
+
+    def phase_done(name, phase_start):
+        now = time.monotonic()
+        entry = phases.setdefault(name, dict(last=0.0, total=0.0))
+        entry['last'] = now - phase_start
+        entry['total'] += now - phase_start
+        return now
+
+    try:
+        for sec in range(SIMU_TIME):
+            sep = '=' * 50
+            print("\n{}\nsimulation time:{:6}/{}\n".format(sep, sec, SIMU_TIME))
+            t = time.monotonic()
+            for i in range(len(r)):
+                r[i].step(sec)
+            t = phase_done("routers", t)
+            if airtime:
+                airtime.tick(sec, r)
+                t = phase_done("airtime", t)
+            if tracer:
+                tracer.tick(sec, r)
+                t = phase_done("trace", t)
+            if not args.no_images:
+                draw_images(ld, area, r, sec)
+                t = phase_done("images", t)
+
+            if telem:
+                for router in r:
+                    for name, msgs in router.tx_msgs_tick.items():
+                        entry = counters['interfaces'].setdefault(name, dict(tx_msgs=0, tx_bytes=0))
+                        entry['tx_msgs'] += msgs
+                        entry['tx_bytes'] += router.tx_bytes_tick[name]
+                        counters['tx_msgs'] += msgs
+                        counters['tx_bytes'] += router.tx_bytes_tick[name]
+                telem.publish(telemetry_snapshot(sec, start_time, phases, counters, airtime, r))
+                phase_done("telemetry", t)
+    finally:
+        # also on interruption, otherwise the trace and airtime.csv are incomplete
+        if airtime:
+            airtime.close()
+        if tracer:
+            tracer.close()
+        if telem:
+            telem.close()
+
+
+def two_router_static_in_range(scenario_name, args):
     ld = os.path.join("run-data", scenario_name)
 
     interfaces = [
@@ -635,9 +829,11 @@ def two_router_static_in_range(scenario_name):
     area = MobilityArea(600, 500)
     r = []
     mm = StaticMobilityModel(area, 200, 250)
-    r.append(Router("1", interfaces=interfaces, mm=mm, log_directory=ld))
+    r.append(Router("1", interfaces=interfaces, mm=mm, log_directory=ld,
+                    msg_compress=not args.no_msg_compress, msg_format=args.wire_format))
     mm = StaticMobilityModel(area, 400, 250)
-    r.append(Router("2", interfaces=interfaces, mm=mm, log_directory=ld))
+    r.append(Router("2", interfaces=interfaces, mm=mm, log_directory=ld,
+                    msg_compress=not args.no_msg_compress, msg_format=args.wire_format))
 
     r[0].register_router(r)
     r[1].register_router(r)
@@ -648,13 +844,7 @@ def two_router_static_in_range(scenario_name):
     r[0].start(0)
     r[1].start(0)
 
-    SIMU_TIME = 1000
-    for sec in range(SIMU_TIME):
-        sep = '=' * 50
-        print("\n{}\nsimulation time:{:6}/{}\n".format(sep, sec, SIMU_TIME))
-        for i in range(len(r)):
-            r[i].step(sec)
-        draw_images(ld, area, r, sec)
+    simulate(ld, area, r, args)
 
 
     #src_id = random.randint(0, NO_ROUTER - 1)
@@ -671,7 +861,7 @@ def two_router_static_in_range(scenario_name):
     #    r[src_id].forward_data_packet(packet_high_througput)
 
 
-def two_hundr_router_static_in_range(scenario_name):
+def two_hundr_router_static_in_range(scenario_name, args):
     ld = os.path.join("run-data", scenario_name)
 
     interfaces = [
@@ -686,19 +876,13 @@ def two_hundr_router_static_in_range(scenario_name):
         x = random.randint(200, 400)
         y = random.randint(200, 300)
         mm = StaticMobilityModel(area, x, y)
-        r.append(Router(str(i), interfaces=interfaces, mm=mm, log_directory=ld))
+        r.append(Router(str(i), interfaces=interfaces, mm=mm, log_directory=ld,
+                        msg_compress=not args.no_msg_compress, msg_format=args.wire_format))
         r[i].register_router(r)
         r[i].connect()
         r[i].start(0)
 
-
-    SIMU_TIME = 1000
-    for sec in range(SIMU_TIME):
-        sep = '=' * 50
-        print("\n{}\nsimulation time:{:6}/{}\n".format(sep, sec, SIMU_TIME))
-        for i in range(len(r)):
-            r[i].step(sec)
-        draw_images(ld, area, r, sec)
+    simulate(ld, area, r, args)
 
 
 scenarios = [
@@ -706,28 +890,43 @@ scenarios = [
         [ "002-20-router-static-in-range", two_hundr_router_static_in_range ]
 ]
 
-def die():
-    print("scenario as argument required")
-    for scenario in scenarios:
-        print("  {}".format(scenario[0]))
-    sys.exit(1)
+def parse_args():
+    parser = argparse.ArgumentParser(description="DMPR simulator")
+    parser.add_argument("scenario", choices=[scenario[0] for scenario in scenarios],
+                        help="scenario to simulate")
+    parser.add_argument("--trace", action="store_true",
+                        help="record a compact topology trace (trace.bin.xz), "
+                             "render it later with dmpr-replay.py")
+    parser.add_argument("--no-images", action="store_true",
+                        help="do not render images while simulating")
+    parser.add_argument("--wire-format", choices=("json", "binary"), default="json",
+                        help="routing message encoding, binary packs addresses, "
+                             "interns keys and varint encodes integers")
+    parser.add_argument("--no-msg-compress", action="store_true",
+                        help="do not lzma compress routing messages")
+    parser.add_argument("--no-airtime", action="store_true",
+                        help="disable airtime and channel utilization accounting")
+    parser.add_argument("--airtime-verbose", action="store_true",
+                        help="print the airtime accounting of every tick")
+    parser.add_argument("--telemetry-port", type=int, default=None,
+                        help="serve live JSON snapshots at http://127.0.0.1:<port>/")
+    parser.add_argument("--telemetry-socket", default=None,
+                        help="serve live JSON snapshots via HTTP on this unix socket")
+    return parser.parse_args()
+
 
 def main():
-    if len(sys.argv) > 1:
-        scenario_name = sys.argv[1]
-    else:
-        die()
+    args = parse_args()
 
     for scenario in scenarios:
-        if scenario_name == scenario[0]:
-            setup_img_folder(scenario[0])
+        if args.scenario == scenario[0]:
+            if not args.no_images:
+                setup_img_folder(scenario[0])
             setup_log_folder(scenario[0])
-            scenario[1](scenario[0])
+            scenario[1](scenario[0], args)
             #cmd = "ffmpeg -framerate 10 -pattern_type glob -i 'images-merge/*.png' -c:v libx264 -pix_fmt yuv420p mdvrd.mp4"
             #print("now execute \"{}\" to generate a video".format(cmd))
             sys.exit(0)
-    die()
-
 
 
 if __name__ == '__main__':
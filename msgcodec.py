@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+""" Compact binary encoding for DMPR routing messages
+
+Encodes the message dict handed to msg_tx_cb into a tagged binary form
+which decodes to exactly the dict json.loads(json.dumps(msg)) returns.
+Addresses and prefixes are packed into 4 or 16 bytes, well known keys
+and values are interned into a single byte and integers as well as
+decimal strings are varint encoded.
+
+Every value starts with one tag byte:
+
+  0x80 - 0xff  interned string, index into INTERNED (tag & 0x7f)
+  0x40 - 0x7f  unsigned integer 0 - 63 (tag & 0x3f)
+  0x00 - 0x3f  see TAG_* below
+"""
+
+import json
+import socket
+import struct
+
+
+# append only - the index is the on-air representation
+INTERNED = (
+    "id", "seq-no", "type", "v4", "v6", "proto", "prefix", "prefix-len",
+    "networks", "interfaces", "interface", "addr-v4", "addr-v6", "name",
+    "path", "paths", "hops", "next-hop", "routing-paths", "routing-table",
+    "link-attributes", "link-characteristics", "bandwidth", "loss",
+    "low-loss", "high-throughput", "originator-addr-v4", "originator-addr-v6",
+    "rtn-msg-interval", "rtn-msg-interval-jitter", "rtn-msg-hold-time",
+    "mcast-v4-tx-addr", "mcast-v6-tx-addr", "proto-transport-enable",
+    "wifi0", "tetra0", "24", "64", "",
+)
+assert len(INTERNED) <= 0x80
+
+TAG_NONE = 0x00
+TAG_TRUE = 0x01
+TAG_FALSE = 0x02
+TAG_UINT = 0x03
+TAG_NINT = 0x04
+TAG_FLOAT = 0x05
+TAG_STR = 0x06
+TAG_DECIMAL = 0x07
+TAG_IPV4 = 0x08
+TAG_IPV6 = 0x09
+TAG_LIST = 0x0a
+TAG_DICT = 0x0b
+
+TAG_SMALL_INT = 0x40
+TAG_INTERNED = 0x80
+
+_INTERNED_IDX = dict((s, TAG_INTERNED | i) for i, s in enumerate(INTERNED))
+_FLOAT = struct.Struct("!d")
+# longer decimal strings stay literal, int() limits the conversion length
+_DECIMAL_MAX_LEN = 20
+
+
+def _encode_varint(buf, val):
+    while val > 0x7f:
+        buf.append((val & 0x7f) | 0x80)
+        val >>= 7
+    buf.append(val)
+
+
+def _decode_varint(data, pos):
+    val = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        val |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return val, pos
+        shift += 7
+
+
+def _encode_str(buf, val):
+    tag = _INTERNED_IDX.get(val)
+    if tag is not None:
+        buf.append(tag)
+        return
+    if (len(val) <= _DECIMAL_MAX_LEN and val.isdigit() and val.isascii() and
+            (val == "0" or val[0] != "0")):
+        buf.append(TAG_DECIMAL)
+        _encode_varint(buf, int(val))
+        return
+    if val.count(".") == 3:
+        try:
+            packed = socket.inet_pton(socket.AF_INET, val)
+        except (OSError, ValueError):
+            pass
+        else:
+            if socket.inet_ntop(socket.AF_INET, packed) == val:
+                buf.append(TAG_IPV4)
+                buf += packed
+                return
+    elif ":" in val:
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, val)
+        except (OSError, ValueError):
+            pass
+        else:
+            if socket.inet_ntop(socket.AF_INET6, packed) == val:
+                buf.append(TAG_IPV6)
+                buf += packed
+                return
+    val_bin = val.encode("utf-8")
+    buf.append(TAG_STR)
+    _encode_varint(buf, len(val_bin))
+    buf += val_bin
+
+
+def _encode(buf, val):
+    if isinstance(val, str):
+        _encode_str(buf, val)
+    elif isinstance(val, dict):
+        buf.append(TAG_DICT)
+        _encode_varint(buf, len(val))
+        for k, v in val.items():
+            # same key conversion as json.dumps()
+            _encode_str(buf, k if isinstance(k, str) else json.dumps(k))
+            _encode(buf, v)
+    elif isinstance(val, (list, tuple)):
+        buf.append(TAG_LIST)
+        _encode_varint(buf, len(val))
+        for v in val:
+            _encode(buf, v)
+    elif val is None:
+        buf.append(TAG_NONE)
+    elif val is True:
+        buf.append(TAG_TRUE)
+    elif val is False:
+        buf.append(TAG_FALSE)
+    elif isinstance(val, int):
+        if 0 <= val < 0x40:
+            buf.append(TAG_SMALL_INT | val)
+        elif val >= 0:
+            buf.append(TAG_UINT)
+            _encode_varint(buf, val)
+        else:
+            buf.append(TAG_NINT)
+            _encode_varint(buf, -val - 1)
+    elif isinstance(val, float):
+        buf.append(TAG_FLOAT)
+        buf += _FLOAT.pack(val)
+    else:
+        raise TypeError("type {} not encodable".format(type(val).__name__))
+
+
+def _decode(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag & TAG_INTERNED:
+        return INTERNED[tag & 0x7f], pos
+    if tag & TAG_SMALL_INT:
+        return tag & 0x3f, pos
+    if tag == TAG_DICT:
+        count, pos = _decode_varint(data, pos)
+        val = dict()
+        for i in range(count):
+            k, pos = _decode(data, pos)
+            val[k], pos = _decode(data, pos)
+        return val, pos
+    if tag == TAG_LIST:
+        count, pos = _decode_varint(data, pos)
+        val = list()
+        for i in range(count):
+            v, pos = _decode(data, pos)
+            val.append(v)
+        return val, pos
+    if tag == TAG_IPV4:
+        return socket.inet_ntop(socket.AF_INET, data[pos:pos + 4]), pos + 4
+    if tag == TAG_IPV6:
+        return socket.inet_ntop(socket.AF_INET6, data[pos:pos + 16]), pos + 16
+    if tag == TAG_DECIMAL:
+        val, pos = _decode_varint(data, pos)
+        return str(val), pos
+    if tag == TAG_STR:
+        length, pos = _decode_varint(data, pos)
+        return data[pos:pos + length].decode("utf-8"), pos + length
+    if tag == TAG_UINT:
+        return _decode_varint(data, pos)
+    if tag == TAG_NINT:
+        val, pos = _decode_varint(data, pos)
+        return -val - 1, pos
+    if tag == TAG_FLOAT:
+        return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    raise ValueError("unknown tag {:#04x} at offset {}".format(tag, pos - 1))
+
+
+def encode(msg):
+    buf = bytearray()
+    _encode(buf, msg)
+    return bytes(buf)
+
+
+def decode(data):
+    val, pos = _decode(data, 0)
+    if pos != len(data):
+        raise ValueError("{} trailing bytes after message".format(len(data) - pos))
+    return val
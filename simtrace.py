@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+""" Compact binary topology trace
+
+The simulator records one trace per run. Each tick contains the node
+positions which changed, the per interface adjacency deltas and the
+routing message transmissions which happened within the tick. The trace
+is lzma compressed and can be rendered offline with dmpr-replay.py at
+any resolution, frame rate or time window without re-running the
+simulation.
+
+The trace is a sequence of concatenated xz streams, one per segment of
+TRACE_SEGMENT_TICKS ticks. Every segment is self-contained: it starts
+with the header followed by all interface and node records and its
+first tick carries the full state (all positions and links). A segment
+is flushed to disk when it is complete, an interrupted run loses at
+most the last segment. The sidecar file <trace>.idx lists the first
+tick and the file offset of every segment, so readers can seek.
+
+All integers are big endian. Records start with a one byte tag:
+
+  'I' interface   B idx, B len, name
+  'N' node        H idx, B len, id, B no-interfaces, no-interfaces * (B if-idx, f range)
+  'T' tick        I time, starts a new tick
+  'P' position    H node-idx, f x, f y
+  'L' link up     B if-idx, H node-idx, H neighbor-idx
+  'U' link down   B if-idx, H node-idx, H neighbor-idx
+  'X' transmit    B if-idx, H node-idx, I bytes
+"""
+
+import io
+import lzma
+import os
+import struct
+
+
+TRACE_MAGIC = b"DMPRTRC"
+TRACE_VERSION = 2
+TRACE_SEGMENT_TICKS = 100
+
+_HEADER = struct.Struct("!7sBII")
+_IF_HDR = struct.Struct("!BB")
+_NODE_HDR = struct.Struct("!HB")
+_NODE_NO_IF = struct.Struct("!B")
+_NODE_IF = struct.Struct("!Bf")
+_TICK = struct.Struct("!I")
+_POS = struct.Struct("!Hff")
+_LINK = struct.Struct("!BHH")
+_TX = struct.Struct("!BHI")
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class TraceWriter(object):
+
+    def __init__(self, path, area):
+        self._fd = open(path, "wb")
+        self._index_fd = open(index_path(path), "w")
+        self._header = _HEADER.pack(TRACE_MAGIC, TRACE_VERSION, area.x, area.y)
+        self._compressor = None
+        self._segment_ticks = 0
+        self._if_idx = dict()
+        self._if_records = list()
+        self._node_idx = dict()
+        self._node_records = list()
+        self._positions = dict()
+        self._links = dict()
+        self._tx_pending = list()
+
+
+    def _write(self, data):
+        self._fd.write(self._compressor.compress(data))
+
+
+    def _segment_start(self, time):
+        self._index_fd.write("{} {}\n".format(time, self._fd.tell()))
+        self._index_fd.flush()
+        self._compressor = lzma.LZMACompressor()
+        self._segment_ticks = 0
+        self._write(self._header + b"".join(self._if_records) + b"".join(self._node_records))
+        # forget the known state, the first tick of the segment
+        # then contains all positions and links
+        self._positions = dict()
+        self._links = dict((if_idx, set()) for if_idx in self._links)
+
+
+    def _segment_end(self):
+        if not self._compressor:
+            return
+        self._fd.write(self._compressor.flush())
+        self._fd.flush()
+        self._compressor = None
+
+
+    def _interface_idx(self, name):
+        if name not in self._if_idx:
+            idx = len(self._if_idx)
+            name_bin = name.encode("utf-8")
+            record = b"I" + _IF_HDR.pack(idx, len(name_bin)) + name_bin
+            self._write(record)
+            self._if_records.append(record)
+            self._if_idx[name] = idx
+            self._links[idx] = set()
+        return self._if_idx[name]
+
+
+    def _router_idx(self, router):
+        if router.id not in self._node_idx:
+            idx = len(self._node_idx)
+            if_records = list()
+            for interface in router.interfaces:
+                if_idx = self._interface_idx(interface['name'])
+                if_records.append(_NODE_IF.pack(if_idx, interface['range']))
+            id_bin = str(router.id).encode("utf-8")
+            record = (b"N" + _NODE_HDR.pack(idx, len(id_bin)) + id_bin +
+                      _NODE_NO_IF.pack(len(if_records)) + b"".join(if_records))
+            self._write(record)
+            self._node_records.append(record)
+            self._node_idx[router.id] = idx
+        return self._node_idx[router.id]
+
+
+    def msg_tx(self, router, interface_name, size):
+        """ called by the router for every transmitted routing message,
+        the event is written with the next tick record """
+        self._tx_pending.append((router, interface_name, size))
+
+
+    def tick(self, time, routers):
+        """ called once per simulated second after all routers stepped """
+        if self._segment_ticks >= TRACE_SEGMENT_TICKS:
+            self._segment_end()
+        if not self._compressor:
+            self._segment_start(time)
+        self._segment_ticks += 1
+
+        for router in routers:
+            self._router_idx(router)
+        buf = [b"T" + _TICK.pack(time)]
+
+        for router in routers:
+            idx = self._node_idx[router.id]
+            pos = router.coordinates()
+            if self._positions.get(idx) != pos:
+                self._positions[idx] = pos
+                buf.append(b"P" + _POS.pack(idx, pos[0], pos[1]))
+
+        links = dict((if_idx, set()) for if_idx in self._links)
+        for router in routers:
+            idx = self._node_idx[router.id]
+            for interface_name, neighbors in router.connections.items():
+                if_links = links[self._interface_idx(interface_name)]
+                for neighbor in neighbors.values():
+                    if_links.add((idx, self._router_idx(neighbor)))
+        for if_idx, if_links in links.items():
+            for a, b in if_links - self._links[if_idx]:
+                buf.append(b"L" + _LINK.pack(if_idx, a, b))
+            for a, b in self._links[if_idx] - if_links:
+                buf.append(b"U" + _LINK.pack(if_idx, a, b))
+        self._links = links
+
+        for router, interface_name, size in self._tx_pending:
+            if_idx = self._interface_idx(interface_name)
+            buf.append(b"X" + _TX.pack(if_idx, self._router_idx(router), size))
+        self._tx_pending = list()
+
+        self._write(b"".join(buf))
+
+
+    def close(self):
+        self._segment_end()
+        self._fd.close()
+        self._index_fd.close()
+
+
+
+class TraceFrame(object):
+    """ topology state at the end of a tick, the reader updates
+    one frame object in place - copy what should be kept """
+
+    def __init__(self, area_x, area_y):
+        self.area_x = area_x
+        self.area_y = area_y
+        self.time = None
+        self.interfaces = dict()
+        self.nodes = dict()
+        self.positions = dict()
+        self.links = dict()
+        self.tx = list()
+
+
+
+class TraceReader(object):
+
+    def __init__(self, path):
+        self._path = path
+
+
+    def index(self):
+        """ list of (first tick, file offset) for every segment,
+        empty if the index file is missing """
+        segments = list()
+        if not os.path.exists(index_path(self._path)):
+            return segments
+        with open(index_path(self._path)) as fd:
+            for line in fd:
+                fields = line.split()
+                if len(fields) == 2:
+                    segments.append((int(fields[0]), int(fields[1])))
+        return segments
+
+
+    def _offset(self, start):
+        offset = 0
+        for time, segment_offset in self.index():
+            if start is None or time > start:
+                break
+            offset = segment_offset
+        return offset
+
+
+    def end(self):
+        """ time after the last complete tick, decodes only the last
+        readable segment if the index is available """
+        offsets = [offset for time, offset in self.index()]
+        for offset in reversed([0] + offsets):
+            end = None
+            for segment, complete in self._segments(offset):
+                try:
+                    for frame in self._frames_segment(io.BytesIO(segment), complete):
+                        end = frame.time + 1
+                except EOFError:
+                    if complete:
+                        raise
+            if end is not None:
+                return end
+        return 0
+
+
+    def _read(self, fd, st):
+        data = fd.read(st.size)
+        if len(data) != st.size:
+            raise EOFError("truncated trace file: {}".format(self._path))
+        return st.unpack(data)
+
+
+    def _read_str(self, fd, length):
+        data = fd.read(length)
+        if len(data) != length:
+            raise EOFError("truncated trace file: {}".format(self._path))
+        return data.decode("utf-8")
+
+
+    def _segments(self, offset):
+        """ yields the decompressed data of every segment and
+        if the segment was completely written """
+        with open(self._path, "rb") as fd:
+            fd.seek(offset)
+            data = fd.read()
+        while data:
+            decompressor = lzma.LZMADecompressor()
+            try:
+                segment = decompressor.decompress(data)
+            except lzma.LZMAError:
+                return
+            yield segment, decompressor.eof
+            if not decompressor.eof:
+                return
+            data = decompressor.unused_data
+
+
+    def _frames_segment(self, fd, complete):
+        magic, version, area_x, area_y = self._read(fd, _HEADER)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise Exception("not a DMPR trace (version {}): {}".format(
+                            TRACE_VERSION, self._path))
+        frame = TraceFrame(area_x, area_y)
+        while True:
+            tag = fd.read(1)
+            if tag == b"T":
+                if frame.time is not None:
+                    yield frame
+                frame.time, = self._read(fd, _TICK)
+                frame.tx = list()
+            elif tag == b"P":
+                idx, x, y = self._read(fd, _POS)
+                frame.positions[idx] = (x, y)
+            elif tag == b"L":
+                if_idx, a, b = self._read(fd, _LINK)
+                frame.links[if_idx].add((a, b))
+            elif tag == b"U":
+                if_idx, a, b = self._read(fd, _LINK)
+                frame.links[if_idx].discard((a, b))
+            elif tag == b"X":
+                frame.tx.append(self._read(fd, _TX))
+            elif tag == b"N":
+                idx, id_len = self._read(fd, _NODE_HDR)
+                id_ = self._read_str(fd, id_len)
+                no_interfaces, = self._read(fd, _NODE_NO_IF)
+                ranges = dict()
+                for i in range(no_interfaces):
+                    if_idx, range_ = self._read(fd, _NODE_IF)
+                    ranges[if_idx] = range_
+                frame.nodes[idx] = (id_, ranges)
+            elif tag == b"I":
+                idx, name_len = self._read(fd, _IF_HDR)
+                frame.interfaces[idx] = self._read_str(fd, name_len)
+                frame.links[idx] = set()
+            elif tag == b"":
+                break
+            else:
+                raise Exception("unknown trace record {!r}: {}".format(
+                                tag, self._path))
+        # the last tick of a truncated segment may be incomplete
+        if complete and frame.time is not None:
+            yield frame
+
+
+    def frames(self, start=None):
+        """ generator, yields the frame after every completed tick.
+        With start given decoding begins at the segment containing
+        it, earlier frames may still be yielded. A truncated tail of
+        an interrupted run is dropped. """
+        for segment, complete in self._segments(self._offset(start)):
+            try:
+                yield from self._frames_segment(io.BytesIO(segment), complete)
+            except EOFError:
+                if complete:
+                    raise
+                return
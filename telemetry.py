@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+""" Live telemetry of a running simulation
+
+A background thread serves JSON snapshots over HTTP, either on a local
+TCP port or on a Unix domain socket:
+
+  GET /         full snapshot including node positions and adjacency
+  GET /status   snapshot without the topology
+
+The simulation loop builds a new snapshot after every tick and publishes
+it by swapping the front reference. A published snapshot is never
+modified again, so the server thread serializes it without any locking
+and the simulation loop never waits for a client.
+"""
+
+import json
+import os
+import stat
+import socketserver
+import threading
+import http.server
+
+
+class _TelemetryHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        snapshot = self.server.telemetry.snapshot()
+        if self.path in ("/", "/snapshot"):
+            pass
+        elif self.path == "/status":
+            snapshot = dict((k, v) for k, v in snapshot.items() if k != "nodes")
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(snapshot).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def address_string(self):
+        # unix domain socket clients have no address
+        return str(self.client_address)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+
+class _TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+
+class Telemetry(object):
+
+    def __init__(self, port=None, unix_socket=None):
+        assert(port or unix_socket)
+        self._front = dict()
+        self._unix_socket = None
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                if not stat.S_ISSOCK(os.stat(unix_socket).st_mode):
+                    raise Exception("telemetry socket path exists and is no socket: {}".format(unix_socket))
+                # stale socket of a previous run
+                os.unlink(unix_socket)
+            self._server = _UnixServer(unix_socket, _TelemetryHandler)
+            self._unix_socket = unix_socket
+            self._unix_socket_id = self._file_id(unix_socket)
+            print("telemetry available at unix socket {}".format(unix_socket))
+        else:
+            self._server = _TCPServer(("127.0.0.1", port), _TelemetryHandler)
+            print("telemetry available at http://127.0.0.1:{}/".format(port))
+        self._server.telemetry = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+
+    def _file_id(self, path):
+        st = os.stat(path)
+        return st.st_dev, st.st_ino
+
+
+    def publish(self, snapshot):
+        """ called by the simulation loop, snapshot must not be
+        modified afterwards """
+        self._front = snapshot
+
+
+    def snapshot(self):
+        return self._front
+
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        # only remove the socket this instance created
+        if (self._unix_socket and os.path.exists(self._unix_socket) and
+                self._file_id(self._unix_socket) == self._unix_socket_id):
+            os.unlink(self._unix_socket)